@@ -0,0 +1,55 @@
+"""Data update coordinator for JUNG HOME."""
+from __future__ import annotations
+
+import logging
+from datetime import timedelta
+
+from .junghome_client import JunghomeError, JunghomeGateway as junghome
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+_LOGGER = logging.getLogger(__name__)
+
+# default interval in which the state of all devices is requested
+DEFAULT_UPDATE_INTERVAL = timedelta(seconds=60)
+
+
+class JunghomeCoordinator(DataUpdateCoordinator):
+    """Fetches all JUNG HOME devices with a single request per interval."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        host: str,
+        token: str,
+        update_interval: timedelta = DEFAULT_UPDATE_INTERVAL
+    ) -> None:
+        """Initialize the coordinator."""
+        super().__init__(hass, _LOGGER, name="junghome", update_interval=update_interval)
+        self.host = host
+        self.token = token
+
+        """latest datapoint values by (device_id, datapoint_id)"""
+        self.values = {}
+
+
+    async def _async_update_data(self) -> dict:
+        """Fetch the device list and index devices and datapoint values.
+
+        Returns a dict of device dictionaries by device id.
+        """
+        try:
+            devices = await junghome.request_devices(self.host, self.token)
+        except JunghomeError as err:
+            raise UpdateFailed(f"failed to get jung home devices: {err}") from err
+
+        # index the first value of each datapoint, entities only need that
+        values = {}
+        for device in devices:
+            for datapoint in device.get("datapoints", []):
+                datapoint_values = datapoint.get("values")
+                if datapoint_values:
+                    values[(device["id"], datapoint.get("id"))] = datapoint_values[0].get("value")
+        self.values = values
+
+        return {device["id"]: device for device in devices}
@@ -1,9 +1,45 @@
 
-import requests
+import asyncio
+import logging
+import ssl
+import aiohttp
+import orjson
+
+_LOGGER = logging.getLogger(__name__)
+
+# SSL verification is disabled, the gateway uses a self-signed certificate.
+# The context is built once at import, without loading any CA certificates.
+SSL_CONTEXT = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+SSL_CONTEXT.check_hostname = False
+SSL_CONTEXT.verify_mode = ssl.CERT_NONE
+
+# fail fast on a stalled gateway instead of waiting for aiohttp's 5 minute default
+TIMEOUT = aiohttp.ClientTimeout(total=10, connect=3)
+
+
+class JunghomeError(Exception):
+    """Raised when data could not be requested from the gateway."""
+
 
 class JunghomeGateway:
 
-    def request_devices(host: str, token: str):
+    # shared http session, keeps connections to the gateway alive between calls
+    _session = None
+
+    # set once the session was closed on shutdown, no new session is opened afterwards
+    _closed = False
+
+    # running PATCH send task per datapoint url, and the latest queued write per url
+    _patch_tasks = {}
+    _patch_pending = {}
+
+    # last ETag and decoded response per GET url, used to revalidate unchanged data
+    _etag_cache = {}
+
+    # running device list requests per (url, token), shared by concurrent callers
+    _devices_inflight = {}
+
+    async def request_devices(host: str, token: str):
         """
         Requests a list of devices from the api-junghome using the specified host and token.
 
@@ -12,20 +48,87 @@ class JunghomeGateway:
         token (str): The authentication token for API access.
 
         Returns:
-        list or None: A list of device dictionaries if the request is successful, None otherwise.
+        list: A list of device dictionaries.
+
+        Raises:
+        JunghomeError: If the request fails, with the cause in its message.
         """
         
         # create url
         url = 'https://' + host + '/api/junghome/functions/'
         
-        # Use the generic HTTP GET request function
-        devices = JunghomeGateway.http_get_request(url, token)
+        # Use the generic HTTP GET request function, joining a request already running
+        key = (url, token)
+        task = JunghomeGateway._devices_inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(JunghomeGateway.http_get_request(url, token))
+            JunghomeGateway._devices_inflight[key] = task
+            task.add_done_callback(lambda task: JunghomeGateway._devices_inflight.pop(key, None))
+            # mark the error as retrieved in case every caller was cancelled meanwhile
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return await asyncio.shield(task)
+
+
+
+    async def patch_datapoint(url: str, token: str, data: dict, create_task=asyncio.ensure_future):
+        """
+        Writes a datapoint, coalescing writes that arrive while one is in flight.
+
+        While a PATCH for a datapoint url is running, further writes to the same url
+        are not sent immediately. Only the most recent one is kept and sent once the
+        running request finished, superseded writes resolve with its response.
+        Dragging a brightness slider thus results in two requests instead of one per step.
+        Writes are sent by a task per url, cancelling a caller does not drop queued writes.
+
+        Parameters:
+        url (str): The datapoint URL to which the PATCH request is sent.
+        token (str): The authentication token for API access.
+        data (dict or bytes): The data to be sent in the request body, bytes are sent as encoded JSON.
+        create_task (callable): Starts the send task, lets the caller track it until it finished.
+
+        Returns:
+        dict or None: The JSON response of the request that carried this write, None if it failed.
+        """
         
-        if devices is None:
-            print("failed to get jung home devices.")
-            return None
+        pending = JunghomeGateway._patch_pending
+        tasks = JunghomeGateway._patch_tasks
+        
+        # queue write, replacing any older queued write
+        queued = pending.get(url)
+        future = queued[2] if queued is not None else asyncio.get_running_loop().create_future()
+        pending[url] = (token, data, future)
         
-        return devices
+        # start sending unless a task for this url is running already
+        if url not in tasks:
+            tasks[url] = create_task(JunghomeGateway.send_pending_patches(url))
+        
+        return await asyncio.shield(future)
+
+
+
+    async def send_pending_patches(url: str):
+        """
+        Sends the queued writes for a datapoint url until none is left.
+
+        Parameters:
+        url (str): The datapoint URL to which the PATCH requests are sent.
+        """
+        
+        pending = JunghomeGateway._patch_pending
+        try:
+            while url in pending:
+                token, data, future = pending.pop(url)
+                response = None
+                try:
+                    response = await JunghomeGateway.http_patch_request(url, token, data)
+                finally:
+                    if not future.done():
+                        future.set_result(response)
+        finally:
+            JunghomeGateway._patch_tasks.pop(url, None)
+            queued = pending.pop(url, None)
+            if queued is not None and not queued[2].done():
+                queued[2].set_result(None)
 
 
 
@@ -33,47 +136,109 @@ class JunghomeGateway:
     # HTTP HELPER FUNCTIONS
     # ==================================================================================
 
-    def http_get_request(url, token):
+    def get_session():
+        """
+        Returns the shared HTTP session, creating it on first use.
+
+        Reusing one session pools the TLS connection to the gateway instead of
+        doing a full connect and handshake for every request.
+        Must be called from within the running event loop.
+
+        Returns:
+            aiohttp.ClientSession:  The shared session used for all gateway requests.
+
+        Raises:
+            aiohttp.ClientConnectionError:  If the session was already closed on shutdown.
+        """
+        
+        # do not reopen a session nobody would close anymore
+        if JunghomeGateway._closed:
+            raise aiohttp.ClientConnectionError("gateway session is closed")
+        
+        if JunghomeGateway._session is None or JunghomeGateway._session.closed:
+            connector = aiohttp.TCPConnector(ssl=SSL_CONTEXT)
+            JunghomeGateway._session = aiohttp.ClientSession(connector=connector, timeout=TIMEOUT)
+        
+        return JunghomeGateway._session
+
+
+
+    async def close_session():
+        """
+        Closes the shared HTTP session if one was opened.
+
+        Requests made afterwards fail instead of opening a new session.
+        """
+        
+        JunghomeGateway._closed = True
+        session = JunghomeGateway._session
+        JunghomeGateway._session = None
+        if session is not None and not session.closed:
+            await session.close()
+
+
+
+
+    async def http_get_request(url, token):
         """
         Sends an HTTP GET request to the specified URL with authorization provided by the token.
 
+        If an earlier response for the URL carried an ETag, the request is made conditional
+        and a 304 Not Modified answer returns the previously decoded response.
+
         Parameters:
             url (str):      The URL to which the GET request is sent.
             token (str):    The authorization token included in the request headers.
 
         Returns:
-            dict:   The JSON response from the server if the request is successful.
-            None:   Returns None if the request fails or raises an exception.
+            dict:   The JSON response from the server.
+
+        Raises:
+            JunghomeError:  If the request fails, with the cause in its message.
         """
         
-        # Disabling SSL verification
-        requests.packages.urllib3.disable_warnings()
-        
         # create header
         headers = {
             'accept': 'application/json',
             'token': token
         }
         
+        # revalidate cached response
+        cached = JunghomeGateway._etag_cache.get(url)
+        if cached is not None:
+            headers['If-None-Match'] = cached[0]
+        
         # send request
         try:
-            response = requests.get(url, headers=headers, verify=False)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"failed to get data: {e}")
-            return None
+            async with JunghomeGateway.get_session().get(url, headers=headers) as response:
+                if response.status == 304 and cached is not None:
+                    return cached[1]
+                response.raise_for_status()
+                data = orjson.loads(await response.read())
+        except (aiohttp.ClientError, asyncio.TimeoutError, orjson.JSONDecodeError) as e:
+            # the coordinator reports the cause, logging an outage only once
+            raise JunghomeError(f"failed to get data from {url}: {type(e).__name__}: {e}") from e
+        
+        # remember ETag for the next request
+        etag = response.headers.get('ETag')
+        if etag is not None:
+            JunghomeGateway._etag_cache[url] = (etag, data)
+        else:
+            JunghomeGateway._etag_cache.pop(url, None)
+        
+        return data
 
 
 
 
-    def http_patch_request(url, token, data):
+    async def http_patch_request(url, token, data):
         """
         Sends an HTTP PATCH request to the specified URL with the provided data and authorization token.
 
         Parameters:
             url (str):      The URL to which the PATCH request is sent.
             data (dict):    The data to be sent in the request body, typically in JSON format.
+                            Already encoded JSON may be passed as bytes.
             token (str):    The authorization token included in the request headers.
 
         Returns:
@@ -81,9 +246,6 @@ class JunghomeGateway:
             None:   Returns None if the request encounters an error or raises an exception.
         """
         
-        # Disabling SSL verification
-        requests.packages.urllib3.disable_warnings()
-        
         # create header
         headers = {
             'accept': 'application/json',
@@ -91,11 +253,15 @@ class JunghomeGateway:
             'token': token
         }
         
+        # encode body unless it is already encoded
+        if not isinstance(data, bytes):
+            data = orjson.dumps(data)
+        
         # send request
         try:
-            response = requests.patch(url, headers=headers, json=data, verify=False)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"failed to update data: {e}")
+            async with JunghomeGateway.get_session().patch(url, headers=headers, data=data) as response:
+                response.raise_for_status()
+                return orjson.loads(await response.read())
+        except (aiohttp.ClientError, asyncio.TimeoutError, orjson.JSONDecodeError) as e:
+            _LOGGER.warning("failed to update data at %s: %s", url, e)
             return None
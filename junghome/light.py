@@ -1,17 +1,24 @@
 """Platform for light integration."""
 from __future__ import annotations
 
+import asyncio
+import functools
 import logging
+from typing import Any
+import orjson
 import voluptuous as vol
 from .junghome_client import JunghomeGateway as junghome
+from .coordinator import DEFAULT_UPDATE_INTERVAL, JunghomeCoordinator
 
 
 # Import the device class from the component that you want to support
 import homeassistant.helpers.config_validation as cv
-from homeassistant.components.light import (ATTR_BRIGHTNESS, SUPPORT_BRIGHTNESS, PLATFORM_SCHEMA, LightEntity, ColorMode)
-from homeassistant.const import CONF_HOST, CONF_PASSWORD, CONF_USERNAME
-from homeassistant.core import HomeAssistant
+from homeassistant.components.light import (ATTR_BRIGHTNESS, PLATFORM_SCHEMA, LightEntity, ColorMode)
+from homeassistant.const import CONF_HOST, CONF_PASSWORD, CONF_SCAN_INTERVAL, CONF_USERNAME, EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import PlatformNotReady
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.helpers.typing import ConfigType, DiscoveryInfoType
 _LOGGER = logging.getLogger(__name__)
 
@@ -22,8 +29,34 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Optional(CONF_PASSWORD): cv.string,
 })
 
+# device types set up as lights
+LIGHT_TYPES = frozenset({"OnOff", "DimmerLight", "ColorLight", "Socket"})
 
-def setup_platform(
+# supported color modes, shared by all lights of a kind
+ONOFF_COLOR_MODES = frozenset({ColorMode.ONOFF})
+BRIGHTNESS_COLOR_MODES = frozenset({ColorMode.BRIGHTNESS})
+
+# hass.data key set once the listener closing the gateway session is registered
+DATA_CLOSE_LISTENER = "junghome_close_listener"
+
+# brightness changes within this window (seconds) are sent as one request
+BRIGHTNESS_DEBOUNCE = 0.1
+
+# home assistant brightness (0..255) to gateway brightness in percent
+BRIGHTNESS_PERCENT = tuple(str(round(i * 100 / 255)) for i in range(256))
+
+# switch request bodies never change, encode them once
+SWITCH_ON_BODY = orjson.dumps({"data": [{"key": "switch", "value": "1"}]})
+SWITCH_OFF_BODY = orjson.dumps({"data": [{"key": "switch", "value": "0"}]})
+
+
+@functools.lru_cache(maxsize=101)
+def brightness_body(value: str) -> bytes:
+    """Return the encoded request body for a brightness value in percent."""
+    return orjson.dumps({"data": [{"key": "brightness", "value": value}]})
+
+
+async def async_setup_platform(
     hass: HomeAssistant,
     config: ConfigType,
     add_entities: AddEntitiesCallback,
@@ -34,35 +67,43 @@ def setup_platform(
     host = config[CONF_HOST]
     username = config[CONF_USERNAME]
     password = config.get(CONF_PASSWORD)
-
-    # get jung home devices
-    devices = junghome.request_devices(host, password)
-
-    lights = []
-    for device in devices:
+    scan_interval = config.get(CONF_SCAN_INTERVAL, DEFAULT_UPDATE_INTERVAL)
+
+    # close the shared gateway session once pending writes were sent on shutdown,
+    # registered once across setup retries
+    if not hass.data.get(DATA_CLOSE_LISTENER):
+        async def close_session(event):
+            await junghome.close_session()
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_CLOSE, close_session)
+        hass.data[DATA_CLOSE_LISTENER] = True
+
+    # get jung home devices, polled for all lights at once from now on
+    coordinator = JunghomeCoordinator(hass, host, password, scan_interval)
+    await coordinator.async_refresh()
+    if not coordinator.last_update_success:
+        raise PlatformNotReady(str(coordinator.last_exception))
+
+    entities = []
+    for device in coordinator.data.values():
     
         # skip non-light devices 
-        light_types = ["OnOff", "DimmerLight", "ColorLight", "Socket"] 
-        if device["type"] not in light_types:
+        if device["type"] not in LIGHT_TYPES:
             continue
         
-        # get switch_id
-        switch_id = None
+        # index datapoint ids by type in a single pass
+        datapoint_ids = {}
         for datapoint in device.get("datapoints", []):
-            if datapoint.get("type") == "switch":
-                switch_id = datapoint.get("id")
-                break
+            datapoint_ids.setdefault(datapoint.get("type"), datapoint.get("id"))
+        
+        # get switch_id
+        switch_id = datapoint_ids.get("switch")
             
         # Skip no switch datapoint
         if switch_id is None:
             continue  
             
         # get brightness_id
-        brightness_id = None
-        for datapoint in device.get("datapoints", []):
-            if datapoint.get("type") == "brightness":
-                brightness_id = datapoint.get("id")
-                break
+        brightness_id = datapoint_ids.get("brightness")
         
         # compose device info
         device_info = {
@@ -73,132 +114,195 @@ def setup_platform(
             "ip": host,
             "token": password
         }
-        lights.append(device_info)
+        entities.append(LightClass(coordinator, device_info))
 
-    add_entities(LightClass(light) for light in lights)
+    # register all entities at once, state is taken from the coordinator
+    add_entities(entities, update_before_add=False)
 
 
     
     
-class LightClass(LightEntity):
+class LightClass(CoordinatorEntity, LightEntity):
 
-    def __init__(self, light) -> None:
+    def __init__(self, coordinator: JunghomeCoordinator, light) -> None:
         """Initialize a Light."""
-        self._light = light
-        self._name = light["name"]
+        super().__init__(coordinator)
+        self._attr_name = light["name"]
+        self._attr_unique_id = light["device_id"]
         self._device_id = light["device_id"]
         self._switch_id = light["switch_id"]
         self._brightness_id = light["brightness_id"]
         self._token = light["token"]
         self._ip = light["ip"]
-        self._switch = False
-        self._brightness = 0
+        self._attr_is_on = False
+        self._attr_brightness = 0
+        self._brightness_body = None
+        self._brightness_task = None
+        self._pending_writes = 0
+
+        """build datapoint urls once"""
+        base_url = f'https://{self._ip}/api/junghome/functions/{self._device_id}/datapoints/'
+        self._switch_url = f'{base_url}{self._switch_id}'
+        self._brightness_url = None
+        if self._brightness_id is not None:
+            self._brightness_url = f'{base_url}{self._brightness_id}'
 
         """set supported mode"""
-        supported_color_modes = {ColorMode.ONOFF}
         if self._brightness_id is not None:
-            supported_color_modes.add(ColorMode.BRIGHTNESS)
-        self._attr_supported_color_modes = supported_color_modes
-
+            self._attr_supported_color_modes = BRIGHTNESS_COLOR_MODES
+            self._attr_color_mode = ColorMode.BRIGHTNESS
+        else:
+            self._attr_supported_color_modes = ONOFF_COLOR_MODES
+            self._attr_color_mode = ColorMode.ONOFF
 
-    @property
-    def name(self) -> str:
-        """Return the display name of this light."""
-        return self._name
+        """set initial state"""
+        self._update_state()
 
 
-    @property
-    def unique_id(self) -> str | None:
-        return self._light["device_id"]
+    def _update_state(self) -> None:
+        """Read switch and brightness state from the latest coordinator data."""
+        values = self.coordinator.values
         
+        switch_value = values.get((self._device_id, self._switch_id))
+        if switch_value is not None:
+            self._attr_is_on = bool(int(switch_value))
         
+        if self._brightness_id is not None:
+            brightness_value = values.get((self._device_id, self._brightness_id))
+            if brightness_value is not None:
+                self._attr_brightness = round(float(brightness_value) / 100 * 255)
+
+
     @property
-    def brightness(self):
-        """Return the brightness of the light.
+    def available(self) -> bool:
+        """Return true if the gateway is reachable and still reports this light."""
+        return super().available and self._device_id in self.coordinator.data
 
-        This method is optional. Removing it indicates to Home Assistant
-        that brightness is not supported for this light.
-        """
-        return self._brightness
 
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Handle updated data from the coordinator."""
+        # keep the optimistic state while a write for this light is pending
+        if self._brightness_task is None and not self._pending_writes:
+            self._update_state()
+        super()._handle_coordinator_update()
 
-    @property
-    def is_on(self) -> bool | None:
-        """Return true if light is on."""
-        return self._switch
 
+    async def async_will_remove_from_hass(self) -> None:
+        """Send a brightness change still waiting for its debounce window."""
+        task = self._brightness_task
+        if task is not None:
+            await asyncio.shield(task)
+        await super().async_will_remove_from_hass()
 
 
-    def turn_on(self, **kwargs: Any) -> None:
+    async def async_turn_on(self, **kwargs: Any) -> None:
         """Instruct the light to turn on."""
-        #self._light.turn_on()
-        self._switch = True
+        brightness = int(kwargs.get(ATTR_BRIGHTNESS,255))
+        
+        # skip request if the light is already in the requested state
+        if self._attr_is_on and (self._brightness_id is None or self._attr_brightness == brightness):
+            return
+        
+        previous = (self._attr_is_on, self._attr_brightness)
+        values = self.coordinator.values
+        self._attr_is_on = True
         
         if self._brightness_id is not None:
             """turn on by setting brightness"""
-            self._brightness  = int(kwargs.get(ATTR_BRIGHTNESS,255))
-            url = f'https://{self._ip}/api/junghome/functions/{self._device_id}/datapoints/{self._brightness_id}'
-            body = {
-                "data": [{
-                            "key": "brightness",
-                            "value": str(int((self._brightness / 255) * 100))
-                        }]
-            }
-            response = junghome.http_patch_request(url, self._token, body)
-            if response is None: print("failed to turn on light.")
+            self._attr_brightness  = brightness
+            self.async_write_ha_state()
+            self._brightness_body = brightness_body(BRIGHTNESS_PERCENT[self._attr_brightness])
+            
+            # send only the latest brightness of the debounce window
+            task = self._brightness_task
+            if task is None:
+                task = self.hass.async_create_task(self._async_send_brightness(previous, values))
+                self._brightness_task = task
+            await asyncio.shield(task)
         else:
             """turn on by switching"""
-            url = f'https://{self._ip}/api/junghome/functions/{self._device_id}/datapoints/{self._switch_id}'
-            body = {
-                "data": [{
-                            "key": "switch",
-                            "value": "1"
-                        }]
-            }
-            response = junghome.http_patch_request(url, self._token, body)
-            if response is None: print("failed to turn off light.")
+            self.async_write_ha_state()
+            written = (True, self._attr_brightness)
+            if not await self._async_write(self._switch_url, SWITCH_ON_BODY):
+                _LOGGER.warning("failed to turn on light %s.", self._attr_name)
+                self._restore_state(previous, written, values)
 
 
 
-    def turn_off(self, **kwargs: Any) -> None:
+    async def async_turn_off(self, **kwargs: Any) -> None:
         """Instruct the light to turn off."""
-        #self._light.turn_off()
-        self._switch = False
-        self._brightness = 0
         
-        url = f'https://{self._ip}/api/junghome/functions/{self._device_id}/datapoints/{self._switch_id}'
-        body = {
-            "data": [{
-                        "key": "switch",
-                        "value": "0"
-                    }]
-        }
-        response = junghome.http_patch_request(url, self._token, body)
-        if response is None: print("failed to turn off light.")
+        # skip request if the light is already off
+        if not self._attr_is_on:
+            return
+        
+        previous = (self._attr_is_on, self._attr_brightness)
+        values = self.coordinator.values
+        self._attr_is_on = False
+        self._attr_brightness = 0
+        self._brightness_body = None
+        self.async_write_ha_state()
 
+        if not await self._async_write(self._switch_url, SWITCH_OFF_BODY):
+            _LOGGER.warning("failed to turn off light %s.", self._attr_name)
+            self._restore_state(previous, (False, 0), values)
 
 
-    def update(self) -> None:
-        """Fetch new state data for this light.
-        This is the only method that should fetch new data for Home Assistant.
-        """
-        
-        url = f'https://{self._ip}/api/junghome/functions/{self._device_id}/datapoints/{self._switch_id}'
-        headers = {
-            'accept': 'application/json',
-            'token': self._token
-        }
+
+    async def _async_send_brightness(self, previous: tuple[bool, int], values: dict) -> None:
+        """Send the latest requested brightness once the debounce window passed."""
+        await asyncio.sleep(BRIGHTNESS_DEBOUNCE)
         
-        response = junghome.http_get_request(url, self._token)
-        if response is None: 
-            print("failed get state of light.")
-            return None
+        # later changes start a new window, a turn off meanwhile drops the change
+        self._brightness_task = None
+        body = self._brightness_body
+        self._brightness_body = None
+        if body is None:
+            return
         
+        brightness = self._attr_brightness
+        if not await self._async_write(self._brightness_url, body):
+            _LOGGER.warning("failed to set brightness of light %s.", self._attr_name)
+            self._restore_state(previous, (True, brightness), values)
+
+
+
+    async def _async_write(self, url: str, body: bytes) -> bool:
+        """Send a datapoint write, returns False if it failed.
 
-        switch_value_str = response['values'][0]['value']
-        switch_value = bool(int(switch_value_str))
+        Coordinator updates are held back while writes are in flight, as a poll
+        fetched meanwhile may still report the state from before the write.
+        A successful write requests a refresh to confirm it, requests of all lights
+        are debounced by the coordinator into a single one.
+        """
+        self._pending_writes += 1
+        try:
+            response = await junghome.patch_datapoint(url, self._token, body, self.hass.async_create_task)
+        finally:
+            self._pending_writes -= 1
+        if response is None:
+            return False
         
-        self._switch = switch_value
-        self._brightness = self._brightness
+        self.hass.async_create_task(self.coordinator.async_request_refresh())
+        return True
+
+
 
+    @callback
+    def _restore_state(self, previous: tuple[bool, int], written: tuple[bool, int], values: dict) -> None:
+        """Undo an optimistic state write after its command failed.
 
+        The state is only restored while it still is the one written for the failed
+        command, so a newer command's state is kept. Restoring it lets a retry of
+        the same command be sent instead of being skipped as redundant.
+        `values` are the coordinator values the command started from, if a poll
+        replaced them meanwhile its state is taken instead of the older `previous`.
+        """
+        if (self._attr_is_on, self._attr_brightness) != written:
+            return
+        if self.coordinator.values is values:
+            self._attr_is_on, self._attr_brightness = previous
+        else:
+            self._update_state()
+        self.async_write_ha_state()